@@ -178,14 +178,11 @@ class ResultScreen(BoxLayout, Screen):
 
             assign_results = self._assign_detection(transf_results.cards)
 
-            solution = self._solve(assign_results.cards)
+            self._solve(assign_results.cards)
 
         except Exception as e:
             lgr.exception("Solver failure")
             ui.popup("Solver failure", msg=e, close_btn=True)
-            return
-
-        self.display_solution(solution)
 
     def display_image(self, img_path):
         ImageWidget = AndroidAsyncImage if platform == 'android' else AsyncImage
@@ -259,14 +256,11 @@ class ResultScreen(BoxLayout, Screen):
         try:
             assign_results = self._assign_detection(transformed_cards)
 
-            solution = self._solve(assign_results.cards)
+            self._solve(assign_results.cards)
 
         except Exception as e:
             lgr.exception("Solver failure")
             ui.popup("Solver failure", msg=e, close_btn=True)
-            return
-
-        self.display_solution(solution)
 
     def _assign_detection(self, transformed_cards) -> solve.AssignmentResults:
         lgr.info("Assigning cards..")
@@ -282,10 +276,24 @@ class ResultScreen(BoxLayout, Screen):
 
     def _solve(self, assigned_cards):
         lgr.info("Solving deal..")
-        self.solver.solve(assigned_cards)
+        solver = self.solver
+        future = solver.solve_async(assigned_cards)
 
-        solution = self.solver.present()
-        return solution
+        # DDS runs off the UI thread; display back on the Kivy main loop
+        future.add_done_callback(
+            lambda f: Clock.schedule_once(lambda dt: self._on_solved(solver, f)))
+
+    def _on_solved(self, solver, future):
+        try:
+            future.result()
+            solution = solver.present()
+
+        except Exception as e:
+            lgr.exception("Solver failure")
+            ui.popup("Solver failure", msg=e, close_btn=True)
+            return
+
+        self.display_solution(solution)
 
 
 class DealBox(Carousel):
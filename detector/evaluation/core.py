@@ -1,18 +1,30 @@
 import abc
 import dataclasses
-import json
+import functools
 import pathlib
 import typing
 
 import cv2
-import matplotlib
+import matplotlib.collections
+import matplotlib.patches
 import matplotlib.pyplot as plt
+import numpy as np
 import pandas as pd
 import torch
 
 from . import metrics
 from . import util
 
+try:
+    import numba  # optional, only speeds up GT/pred pairing
+except ImportError:
+    numba = None
+
+try:
+    from orjson import loads as json_loads  # optional, faster parsing
+except ImportError:
+    from json import loads as json_loads
+
 
 FILE_PATH = pathlib.Path(__file__)
 GOLD_DEALS_PATH = FILE_PATH.parent/'test-deals'
@@ -25,10 +37,14 @@ GROUND_TRUTH_FC = (0.8, 1, 0.8)
 PREDICTION_FC = (1, 0.5, 0.5)
 PREDICTION_EC = (1, 0.8, 0.8)
 
+_Rectangle = matplotlib.patches.Rectangle
+
 
-@dataclasses.dataclass(frozen=True)
+@dataclasses.dataclass(frozen=True, eq=False)
 class YoloObject:
-    """Class for YOLO detected or ground truth object."""
+    """Class for YOLO detected or ground truth object.
+
+    Compared & hashed by identity, as each obj is a distinct detection/label."""
     name: str
     x: float
     y: float
@@ -36,6 +52,21 @@ class YoloObject:
     h: float
     confid: typing.Optional[float] = None
 
+    # corner format (x1, y1, x2, y2) & area, precomputed once for IOU calc.
+    x1: float = dataclasses.field(init=False, repr=False)
+    y1: float = dataclasses.field(init=False, repr=False)
+    x2: float = dataclasses.field(init=False, repr=False)
+    y2: float = dataclasses.field(init=False, repr=False)
+    area: float = dataclasses.field(init=False, repr=False)
+
+    def __post_init__(self):
+        # frozen -> bypass `__setattr__`
+        object.__setattr__(self, 'x1', self.x - self.w/2)
+        object.__setattr__(self, 'y1', self.y - self.h/2)
+        object.__setattr__(self, 'x2', self.x + self.w/2)
+        object.__setattr__(self, 'y2', self.y + self.h/2)
+        object.__setattr__(self, 'area', self.w * self.h)
+
 
 class ILabelReader(abc.ABC):
     @abc.abstractmethod
@@ -63,8 +94,7 @@ class BaseYolo4Reader(ILabelReader):
 
 class GroudTruthReader(BaseYolo4Reader):
     def read(self, src):
-        with open(src, 'r') as fi:
-            gt_info = json.load(fi)
+        gt_info = json_loads(pathlib.Path(src).read_bytes())
 
         objs = self._transform_to_objs(gt_info)
         return objs
@@ -72,8 +102,7 @@ class GroudTruthReader(BaseYolo4Reader):
 
 class Yolo4PredReader(BaseYolo4Reader):
     def read(self, src):
-        with open(src, 'r') as fi:
-            pred_info = json.load(fi)[0]['objects']
+        pred_info = json_loads(pathlib.Path(src).read_bytes())[0]['objects']
 
         objs = self._transform_to_objs(pred_info)
         return objs
@@ -130,23 +159,78 @@ class Yolo5PredPandasReader(ILabelReader):
         )
 
 
-def _calc_iou(obj1: YoloObject, obj2: YoloObject):  # tested with another impl.
-    # intersection first (correctness for 6 cases verified)
-    min_w, max_w = 0, min(obj1.w, obj2.w)
-    min_h, max_h = 0, min(obj1.h, obj2.h)
-    possible_w = obj1.w/2 + obj2.w/2 - abs(obj1.x - obj2.x)
-    possible_h = obj1.h/2 + obj2.h/2 - abs(obj1.y - obj2.y)
-    inter_w = min(max(min_w, possible_w), max_w)
-    inter_h = min(max(min_h, possible_h), max_h)
+def _calc_iou(obj1: YoloObject, obj2: YoloObject):
+    """Calc IOU of a single pair; see `_paired_iou` for the batch version."""
+    ax1, ay1, ax2, ay2 = obj1.x1, obj1.y1, obj1.x2, obj1.y2
+    bx1, by1, bx2, by2 = obj2.x1, obj2.y1, obj2.x2, obj2.y2
+
+    inter_w = max(0, min(ax2, bx2) - max(ax1, bx1))
+    inter_h = max(0, min(ay2, by2) - max(ay1, by1))
     area_inter = inter_w * inter_h
 
-    # union
-    area1 = obj1.w * obj1.h
-    area2 = obj2.w * obj2.h
-    area_union = area1 + area2 - area_inter
+    return area_inter / (obj1.area + obj2.area - area_inter)
+
+
+def _stack_boxes(objs: typing.List[YoloObject]):
+    """Stack objects into an (N, 4) array of (x1, y1, x2, y2), plus (N,) arrays of areas, names & confids."""
+    corners = np.array([(o.x1, o.y1, o.x2, o.y2) for o in objs], dtype=float).reshape(-1, 4)
+    areas = np.array([o.area for o in objs], dtype=float)
+    names = np.array([o.name for o in objs], dtype=object)
+    confids = np.array([o.confid for o in objs], dtype=float)
+    return corners, areas, names, confids
+
+
+def _paired_iou(corners1: np.ndarray, areas1: np.ndarray,
+                corners2: np.ndarray, areas2: np.ndarray) -> np.ndarray:
+    """Calc IOU between each row of (P, 4) arrays of (x1, y1, x2, y2), i.e. P pairs at once."""
+    top_left = np.maximum(corners1[:, :2], corners2[:, :2])
+    bottom_right = np.minimum(corners1[:, 2:], corners2[:, 2:])
+    area_inter = np.prod(np.clip(bottom_right - top_left, 0, None), axis=1)
 
-    iou = area_inter / area_union
-    return iou
+    return area_inter / (areas1 + areas2 - area_inter)
+
+
+def _encode_names(names1: np.ndarray, names2: np.ndarray):
+    """Encode class names as int codes shared by both arrays."""
+    codes = pd.Categorical(np.concatenate([names1, names2])).codes
+    return codes[:len(names1)], codes[len(names1):]
+
+
+def _same_name_pairs(name_ids1: np.ndarray, name_ids2: np.ndarray):
+    """List (idx1, idx2) of all pairs sharing a name, in row-major order.
+
+    `name_ids2` is bucketed by name once, so only matching pairs are ever visited."""
+    order2 = np.argsort(name_ids2, kind='stable')
+    sorted_ids2 = name_ids2[order2]
+    starts = np.searchsorted(sorted_ids2, name_ids1, side='left')
+    counts = np.searchsorted(sorted_ids2, name_ids1, side='right') - starts
+
+    idx1 = np.repeat(np.arange(len(name_ids1)), counts)
+    pos_in_bucket = np.arange(len(idx1)) - np.repeat(np.cumsum(counts) - counts, counts)
+    idx2 = order2[np.repeat(starts, counts) + pos_in_bucket]
+    return idx1, idx2
+
+
+if numba is not None:
+    @numba.njit(cache=True, parallel=True)
+    def _iou_pairs(corners1, areas1, corners2, areas2, idx1, idx2, min_iou):
+        """Keep candidate pairs with IOU > `min_iou`; return (idx1, idx2, iou) arrays."""
+        ious = np.zeros(len(idx1))
+        for k in numba.prange(len(idx1)):
+            i, j = idx1[k], idx2[k]
+            inter_w = max(0., min(corners1[i, 2], corners2[j, 2]) - max(corners1[i, 0], corners2[j, 0]))
+            inter_h = max(0., min(corners1[i, 3], corners2[j, 3]) - max(corners1[i, 1], corners2[j, 1]))
+            area_inter = inter_w * inter_h
+            ious[k] = area_inter / (areas1[i] + areas2[j] - area_inter)
+
+        keep = ious > min_iou
+        return idx1[keep], idx2[keep], ious[keep]
+else:
+    def _iou_pairs(corners1, areas1, corners2, areas2, idx1, idx2, min_iou):
+        """Keep candidate pairs with IOU > `min_iou`; return (idx1, idx2, iou) arrays."""
+        ious = _paired_iou(corners1[idx1], areas1[idx1], corners2[idx2], areas2[idx2])
+        keep = ious > min_iou
+        return idx1[keep], idx2[keep], ious[keep]
 
 
 class Evaluator:
@@ -157,6 +241,8 @@ class Evaluator:
         self.gt_objs = GroudTruthReader().read(gt_path)
         self.pred_objs = pred_reader.read(pred_src)
 
+        self._gt_proba_info_cache = {}  # min_iou -> (y_true, y_pred, names)
+
     def report_main_metrics(self):
         mean_ap = self.report_mean_ap(DEFAULT_MIN_IOU)
         subset_mean_ap = self.report_mean_ap(DEFAULT_MIN_IOU, self.DIFFICULT_CLASSES)
@@ -182,49 +268,75 @@ class Evaluator:
         return results
 
     def report_clf_metrics(self, min_iou=DEFAULT_MIN_IOU, thresh=0.5):
-        pairs = list(self.paired_objs(min_iou))
-        gt_proba_info = self._convert_to_gt_proba_info(pairs)
-        return metrics.classification_metrics(gt_proba_info, self.gt_objs, thresh)
+        y_true, y_pred, names = self._convert_to_gt_proba_info(min_iou)
+        return metrics.classification_metrics(y_true, y_pred, names, self.gt_objs, thresh)
 
     def report_mean_ap(self, min_iou=DEFAULT_MIN_IOU, classes=None):
-        pairs = list(self.paired_objs(min_iou))
-        gt_proba_info = self._convert_to_gt_proba_info(pairs)
-        return metrics.mean_average_precision(gt_proba_info, classes)
+        y_true, y_pred, names = self._convert_to_gt_proba_info(min_iou)
+        return metrics.mean_average_precision(y_true, y_pred, names, classes)
 
     def paired_objs(self, min_iou=DEFAULT_MIN_IOU):
         """Pair GT with Pred based on IOU."""
-        paired_gts, paired_preds = set(), set()
-        for gt in self.gt_objs:
-            for pred in self.pred_objs:
-                if gt.name == pred.name:
-                    iou = _calc_iou(gt, pred)
-                    if iou > min_iou:
-                        paired_gts.add(gt)
-                        paired_preds.add(pred)
-                        yield (gt, pred, iou)
-
-        for gt in self.gt_objs:
-            if gt not in paired_gts:
-                yield (gt, None, None)
-
-        for pred in self.pred_objs:
-            if pred not in paired_preds:
-                yield (None, pred, None)
-
-    def _convert_to_gt_proba_info(self, pairs):
-        gt_n_probas = []
-        for gt_obj, pred_obj, __ in pairs:
-            if gt_obj is None:
-                # FP potentially
-                y_true, y_pred, name = 0, pred_obj.confid, pred_obj.name
-            elif pred_obj is None:
-                # FN
-                y_true, y_pred, name = 1, 0, gt_obj.name
-            else:  # iou >= min_iou
-                y_true, y_pred, name = 1, pred_obj.confid, gt_obj.name
-
-            gt_n_probas.append((y_true, y_pred, name))
-        return gt_n_probas
+        gt_idx, pred_idx, ious, fn_idx, fp_idx = self._match(min_iou)
+
+        for i, j, iou in zip(gt_idx, pred_idx, ious):
+            yield (self.gt_objs[i], self.pred_objs[j], float(iou))
+
+        for i in fn_idx:
+            yield (self.gt_objs[i], None, None)
+
+        for j in fp_idx:
+            yield (None, self.pred_objs[j], None)
+
+    @functools.cached_property
+    def _gt_arrays(self):
+        return _stack_boxes(self.gt_objs)
+
+    @functools.cached_property
+    def _pred_arrays(self):
+        return _stack_boxes(self.pred_objs)
+
+    @functools.cached_property
+    def _candidate_pairs(self):
+        """Same-class (gt_idx, pred_idx, iou) with IOU > 0, shared by all `min_iou` levels."""
+        gt_corners, gt_areas, gt_names, __ = self._gt_arrays
+        pred_corners, pred_areas, pred_names, __ = self._pred_arrays
+        gt_name_ids, pred_name_ids = _encode_names(gt_names, pred_names)
+        gt_idx, pred_idx = _same_name_pairs(gt_name_ids, pred_name_ids)  # only pair same class
+
+        return _iou_pairs(
+            gt_corners, gt_areas, pred_corners, pred_areas,
+            gt_idx, pred_idx, 0.)
+
+    def _match(self, min_iou):
+        """Return paired (gt_idx, pred_idx, iou), plus unpaired gt_idx (FN) & pred_idx (FP)."""
+        gt_idx, pred_idx, ious = self._candidate_pairs
+        is_paired = ious > min_iou
+        gt_idx, pred_idx, ious = gt_idx[is_paired], pred_idx[is_paired], ious[is_paired]
+
+        fn_idx = np.setdiff1d(np.arange(len(self.gt_objs)), gt_idx)
+        fp_idx = np.setdiff1d(np.arange(len(self.pred_objs)), pred_idx)
+        return gt_idx, pred_idx, ious, fn_idx, fp_idx
+
+    def _convert_to_gt_proba_info(self, min_iou):
+        """Return arrays of (y_true, y_pred, class name), in the same order as `paired_objs`."""
+        if min_iou in self._gt_proba_info_cache:
+            return self._gt_proba_info_cache[min_iou]
+
+        __, __, gt_names, __ = self._gt_arrays
+        __, __, pred_names, pred_confids = self._pred_arrays
+        gt_idx, pred_idx, __, fn_idx, fp_idx = self._match(min_iou)
+
+        # paired (iou > min_iou) -> FN -> FP potentially
+        y_true = np.concatenate([np.ones(len(gt_idx) + len(fn_idx), dtype=int),
+                                 np.zeros(len(fp_idx), dtype=int)])
+        y_pred = np.concatenate([pred_confids[pred_idx],
+                                 np.zeros(len(fn_idx)),
+                                 pred_confids[fp_idx]])
+        names = np.concatenate([gt_names[gt_idx], gt_names[fn_idx], pred_names[fp_idx]])
+
+        self._gt_proba_info_cache[min_iou] = (y_true, y_pred, names)
+        return y_true, y_pred, names
 
 
 def report_baseline():
@@ -295,15 +407,17 @@ def plot_gold_misclf(weight_path, min_iou=DEFAULT_MIN_IOU, thresh=0.5):
 
 def plot_paired_boxes(obj1: YoloObject, obj2: YoloObject, ax=None):
     print(obj1, obj2, _calc_iou(obj1, obj2), sep='\n')
-    ax = _plot_bbox(obj1, (1, 1), ec='b', ax=ax)
-    ax = _plot_bbox(obj2, (1, 1), ec='r', ax=ax)
+    ax = _plot_bbox(obj1, 1, 1, ec='b', ax=ax)
+    ax = _plot_bbox(obj2, 1, 1, ec='r', ax=ax)
     return
 
 
 def plot_misclf(pairs, img_filepath, thresh=0.5, classes=None):
     img = _load_img(img_filepath)
+    x_scaler, y_scaler = img.shape[:2]
 
     __, ax = plt.subplots(figsize=(12, 12))
+    bboxes = []
     for gt, pred, __ in pairs:
         if not _is_misclf(gt, pred, thresh):
             continue
@@ -311,13 +425,14 @@ def plot_misclf(pairs, img_filepath, thresh=0.5, classes=None):
             continue
 
         if gt is not None:
-            ax = _plot_bbox(gt, img_shape=img.shape, ax=ax, ec='g')
-            ax = _plot_label(gt, 'top', img_shape=img.shape, ax=ax, ec=GROUND_TRUTH_EC, fc=GROUND_TRUTH_FC)
+            bboxes.append(_make_bbox(gt, x_scaler, y_scaler, ec='g'))
+            ax = _plot_label(gt, 'top', x_scaler, y_scaler, ax=ax, ec=GROUND_TRUTH_EC, fc=GROUND_TRUTH_FC)
         if pred is not None:
-            ax = _plot_bbox(pred, img_shape=img.shape, ax=ax, ec='r')
+            bboxes.append(_make_bbox(pred, x_scaler, y_scaler, ec='r'))
             pred_fc = PREDICTION_FC if pred.confid >= thresh else (.5, .5, .5)  # FN ref, rather than FP
-            ax = _plot_label(pred, 'bottom', img_shape=img.shape, ax=ax, ec=PREDICTION_EC, fc=pred_fc)
+            ax = _plot_label(pred, 'bottom', x_scaler, y_scaler, ax=ax, ec=PREDICTION_EC, fc=pred_fc)
 
+    ax.add_collection(matplotlib.collections.PatchCollection(bboxes, match_original=True))
     ax.set_title(pathlib.Path(img_filepath).name)
     ax.imshow(img)
 
@@ -338,12 +453,7 @@ def _list_gold_image_paths():
 
 def _load_img(path):
     image = cv2.imread(str(path))
-    height, width = image.shape[:2]
-    resized_image = cv2.resize(
-        image, (width, height),
-        interpolation=cv2.INTER_CUBIC)
-    converted_image = cv2.cvtColor(resized_image, cv2.COLOR_BGR2RGB)
-    return converted_image
+    return image[..., ::-1]  # BGR -> RGB, as a view
 
 
 def _is_misclf(gt: YoloObject, pred: YoloObject, thresh=0.5):
@@ -364,30 +474,30 @@ def _not_in_classes(gt, pred, classes):
     return not util.in_default(gt_class, classes) and not util.in_default(pd_class, classes)
 
 
-def _plot_bbox(obj: YoloObject, img_shape, ax=None, **kwargs):
-    if ax is None:
-        __, ax = plt.subplots(figsize=(12, 12))
-
-    x_scaler, y_scaler = img_shape[:2]
-
-    x = x_scaler * (obj.x - obj.w/2)
-    y = y_scaler * (obj.y - obj.h/2)
+def _make_bbox(obj: YoloObject, x_scaler, y_scaler, **kwargs):
+    x = x_scaler * obj.x1
+    y = y_scaler * obj.y1
     w = x_scaler * obj.w
     h = y_scaler * obj.h
-    rect = matplotlib.patches.Rectangle(
+    return _Rectangle(
         (x, y),
         w, h,
         linewidth=.5, facecolor='none', alpha=0.7, **kwargs
     )
-    ax.add_patch(rect)
+
+
+def _plot_bbox(obj: YoloObject, x_scaler, y_scaler, ax=None, **kwargs):
+    if ax is None:
+        __, ax = plt.subplots(figsize=(12, 12))
+
+    ax.add_patch(_make_bbox(obj, x_scaler, y_scaler, **kwargs))
     return ax
 
 
-def _plot_label(obj: YoloObject, pos, img_shape, ax=None, **kwargs):
+def _plot_label(obj: YoloObject, pos, x_scaler, y_scaler, ax=None, **kwargs):
     if ax is None:
         __, ax = plt.subplots(figsize=(12, 12))
 
-    x_scaler, y_scaler = img_shape[:2]
     text_y_offset = TEXT_Y_OFFEST if pos == 'bottom' else -TEXT_Y_OFFEST
 
     text_x = x_scaler * obj.x
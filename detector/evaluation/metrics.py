@@ -1,14 +1,13 @@
 import collections
 
+import numpy as np
 import sklearn.metrics
 
-from . import util
 
-
-def classification_metrics(gt_proba_info, gt_objs, thresh=0.5):
+def classification_metrics(y_true, y_prob, names, gt_objs, thresh=0.5):
     count_map = collections.defaultdict(dict)  # class -> counts
 
-    for gt, proba, class_name in gt_proba_info:
+    for gt, proba, class_name in zip(y_true, y_prob, names):
         if gt == 0 and proba >= thresh:
             count_map[class_name]['fp'] = count_map[class_name].get('fp', 0) + 1
         elif gt == 1 and proba >= thresh:
@@ -22,7 +21,8 @@ def classification_metrics(gt_proba_info, gt_objs, thresh=0.5):
     return [{'name': name, **value} for name, value in count_map.items()]
 
 
-def mean_average_precision(gt_proba_info, classes):
-    y_true = [t[0] for t in gt_proba_info if util.in_default(t[2], classes)]
-    y_prob = [t[1] for t in gt_proba_info if util.in_default(t[2], classes)]
+def mean_average_precision(y_true, y_prob, names, classes):
+    if classes:
+        in_classes = np.isin(names, list(classes))
+        y_true, y_prob = y_true[in_classes], y_prob[in_classes]
     return sklearn.metrics.average_precision_score(y_true, y_prob)
@@ -1,18 +1,22 @@
 """Converting .json from yolo into .pbn for pythondds."""
 import abc
-import json
+import collections
 import logging as log
 import pathlib
-from typing import Tuple, List, Dict
+from typing import List, Dict, NamedTuple, Tuple
 
 import numpy as np
 import pandas as pd
-import scipy.spatial
+import scipy.optimize
 
-from solver import dbscan
 from solver import strategy
 from solver import util
 
+try:
+    from orjson import loads as json_loads  # optional, faster parsing
+except ImportError:
+    from json import loads as json_loads
+
 
 CARD_CLASSES = [
     '2s', '3s', '4s', '5s', '6s', '7s', '8s', '9s', '10s', 'Js', 'Qs', 'Ks', 'As',
@@ -20,6 +24,7 @@ CARD_CLASSES = [
     '2d', '3d', '4d', '5d', '6d', '7d', '8d', '9d', '10d', 'Jd', 'Qd', 'Kd', 'Ad',
     '2h', '3h', '4h', '5h', '6h', '7h', '8h', '9h', '10h', 'Jh', 'Qh', 'Kh', 'Ah'
 ]
+CARD_DTYPE = pd.CategoricalDtype(CARD_CLASSES)  # names as int codes under the hood
 
 QUADRANT_TOP = "top"
 QUADRANT_BOTTOM = "bottom"
@@ -45,6 +50,16 @@ HAND_SHORTNAME_MAP = {
 }
 SUIT_S, SUIT_H, SUIT_D, SUIT_C = "s", "h", "d", "c"
 RANKS = ["A", "K", "Q", "J", "10", "9", "8", "7", "6", "5", "4", "3", "2"]
+RANK_ORDER = {rank: i for i, rank in enumerate(RANKS)}
+# canonical (interned) copies of known strings; strs parsed at runtime are new objects otherwise
+_INTERNED = {s: s for s in (*HAND_SHORTNAME_MAP, SUIT_S, SUIT_H, SUIT_D, SUIT_C, *RANKS)}
+
+
+class CardTuple(NamedTuple):
+    """An assigned card, with its name already split into suit & rank."""
+    player: str
+    suit: str
+    rank: str
 
 
 util.setup_basic_logging()
@@ -82,22 +97,26 @@ class DealConverter:
         self.assigner = assigner
 
         self.card_ = None
+        self._pair_cache = None  # symbol pair dists of self.card, reset on read
 
     def read(self, path):
-        self.card = self.reader.read(path)
+        self.card = self.reader.read(path).astype({'name': CARD_DTYPE})
+        self._pair_cache = None
 
-        vcnt = self.card.name.value_counts()
-        msg = ','.join(f"{name} {f'({cnt})' if cnt > 1 else ''}" for name, cnt in vcnt.iteritems())
+        vcnt = self.card.name.value_counts()[lambda s: s > 0]
+        msg = ','.join(f"{name} {f'({cnt})' if cnt > 1 else ''}" for name, cnt in vcnt.items())
         log.info("Read %s detected objs: %s", len(self.card), msg)
 
     def report_missing_and_fp(self):
+        codes = self.card.name.cat.codes
+        counts = np.bincount(codes[codes >= 0], minlength=len(CARD_CLASSES))
+
         # report missing
-        detected_classes = set(self.card.name)
-        missing_classes = [name for name in CARD_CLASSES if name not in detected_classes]
+        missing_classes = [CARD_CLASSES[i] for i in np.flatnonzero(counts == 0)]
         print("Missing cards:", missing_classes)
 
         # report FP
-        fp_classes = self.card.name.value_counts()[lambda s: s > 2].index.tolist()
+        fp_classes = [CARD_CLASSES[i] for i in np.flatnonzero(counts > 2)]
         print("FP cards:", fp_classes)
 
         return missing_classes, fp_classes
@@ -132,14 +151,36 @@ class DealConverter:
         deal = self._build_pbn_deal(hands)
         return deal.encode("ascii")
 
-    def list_assigned_cards(self):
-        return self.assigner.objs[["name", "hand"]].dropna(subset=["hand"]).to_dict('records')
+    def format_pbn_and_cards(self, assigned_cards) -> Tuple[bytes, List[CardTuple]]:
+        """Format hand to PBN and list the assigned cards, in one pass over them.
+
+        Raises ValueError if the cards are not a full deal, see `validate_full_deal()`."""
+        log.info("Formatting hand to PBN..")
+        validate_full_deal(assigned_cards)
+        suits = (SUIT_S, SUIT_H, SUIT_D, SUIT_C)
+        suit_ranks = {(hand, suit): [] for hand in HAND_SHORTNAME_MAP for suit in suits}
+
+        cards = []
+        for card in assigned_cards:
+            name = card['name']
+            card_tuple = CardTuple(_INTERNED[card['hand']], _INTERNED[name[-1]], _INTERNED[name[:-1]])
+            suit_ranks[card_tuple.player, card_tuple.suit].append(card_tuple.rank)
+            cards.append(card_tuple)
+
+        hands = []
+        for hand_name in (HAND_W, HAND_N, HAND_E, HAND_S):  # see _build_pbn_hands
+            hand_suits = [sorted(suit_ranks[hand_name, suit], key=RANK_ORDER.__getitem__)
+                          for suit in suits]
+            hands.append(".".join("".join("T" if r == "10" else r for r in ranks)
+                                  for ranks in hand_suits))
+
+        deal = self._build_pbn_deal(tuple(hands))
+        return deal.encode("ascii"), cards
 
     def _dedup_simple(self):
         """Dedup in a simple way, only keeping the one with highest confidence."""
-        return (self.card
-                    .sort_values('confidence')
-                    .drop_duplicates(subset='name', keep='last'))
+        best = self.card.groupby('name', sort=False, observed=True).confidence.idxmax()
+        return self.card.loc[best]
 
     def _dedup_smart(self):
         """Dedup in a smart way.
@@ -230,17 +271,22 @@ class DealConverter:
             fo.write(deal)
 
     def _calc_symbol_pair_dist(self):
+        if self._pair_cache is not None:
+            return self._pair_cache
+
         card_filtered = (
             self.card[['name', 'confidence', 'center_x', 'center_y']]
                 .rename(columns=lambda s: s.split('_')[-1])
                 .query('confidence >= 0.7')  # debug
+                # only same-name pairs are kept below -> skip names seen once
+                .loc[lambda df: df.name.duplicated(keep=False)]
         )
 
         pair_dist = (
             card_filtered
                 # make uniq names for pair-wise dists
                 .assign(group_rank=lambda df:
-                            df.groupby('name').x
+                            df.groupby('name', observed=True).x
                                 .transform(lambda s: s.rank(method='first')))
                 .assign(uniq_name=lambda df:
                             df.name.str
@@ -249,10 +295,9 @@ class DealConverter:
 
                 .pipe(self._make_pair_wise)
                 .query('name_1 == name_2')
-                .assign(dist_=lambda df: df.apply(
-                    lambda s: scipy.spatial.distance.euclidean([s.x_1, s.y_1], [s.x_2, s.y_2]),
-                    axis=1))
+                .assign(dist_=lambda df: np.hypot(df.x_1 - df.x_2, df.y_1 - df.y_2))
         )
+        self._pair_cache = pair_dist
         return pair_dist
 
     @staticmethod
@@ -264,14 +309,48 @@ class DealConverter:
 
         - `eps` tuned for dist between two symbols on the same card
         - only works for 1-d array currently"""
-        X = np.array(X).reshape(1, -1)
-        clt_id = dbscan.dbscan(X, eps=0.01, min_points=min_size)
-
-        clustered = pd.DataFrame(dict(dist_=X.ravel(), clt_id_=clt_id))
-        if clustered.clt_id_.max() > 1:
+        eps = 0.01
+        x = np.asarray(X, dtype=float).ravel()
+        no_cluster = pd.Series([], dtype=float, name='dist_')
+        if not len(x):
+            return no_cluster
+
+        # same result as dbscan's cluster 1, using that in 1-d eps-neighbourhoods are windows of sorted values
+        order = np.argsort(x, kind='stable')
+        sorted_x = x[order]
+
+        n_neighbours = np.ones(len(x), dtype=int)  # self included
+        for k in range(1, len(x)):
+            close = np.abs(sorted_x[k:] - sorted_x[:-k]) < eps
+            if not close.any():
+                break  # sorted -> points further apart can't be closer
+            n_neighbours[k:] += close
+            n_neighbours[:-k] += close
+
+        is_core = n_neighbours >= min_size
+        if not is_core.any():
+            return no_cluster
+
+        # core points closer than eps are density-connected -> clusters are runs of sorted cores
+        core_x = sorted_x[is_core]
+        core_cluster = np.concatenate([[0], np.cumsum(np.diff(core_x) >= eps)])
+        n_clusters = core_cluster[-1] + 1
+        if n_clusters > 1:
             print("WARNING: more than one cluster found")
-        densest = clustered.loc[clustered.clt_id_ == 1, 'dist_']
-        return densest
+
+        # dbscan grows (and numbers) clusters from their first core point in X
+        starts = np.full(n_clusters, len(x))
+        np.minimum.at(starts, core_cluster, order[is_core])
+        first = starts.argmin()
+        cores = core_x[core_cluster == first]
+        lo, hi = cores[0], cores[-1]
+        in_reach = (((sorted_x >= lo) & (sorted_x <= hi))
+                    | (np.abs(sorted_x - lo) < eps) | (np.abs(sorted_x - hi) < eps))
+
+        # border points next to a later cluster's first core get relabelled when that cluster starts
+        other_starts = x[np.delete(starts, first)]
+        stolen = (np.abs(sorted_x[:, None] - other_starts) < eps).any(axis=1) & ~is_core
+        return pd.Series(sorted_x[in_reach & ~stolen], name='dist_')
 
     @staticmethod
     def _get_good_dup(card, dist, densest_dist):
@@ -290,30 +369,31 @@ class DealConverter:
 
     @staticmethod
     def _make_pair_wise(df: pd.DataFrame):
-        # pair wise -> `from_product`
-        midx = pd.MultiIndex.from_product([df.index, df.index], names=['n1', 'n2'])
-        # need paired x & y info -> reindex and align with `concat`
+        # order doesn't matter -> combination instead of permutation, i.e. upper triangle
+        idx_1, idx_2 = np.triu_indices(len(df), k=1)
+        midx = pd.MultiIndex.from_arrays([df.index[idx_1], df.index[idx_2]], names=['n1', 'n2'])
+        # need paired x & y info -> take rows by position for each side
         pair = pd.concat(
-            [df.add_suffix('_1').reindex(midx, level='n1'),
-             df.add_suffix('_2').reindex(midx, level='n2')], axis=1)
-        # order doesn't matter -> combination instead of permutation
-        return pair.loc[midx[midx.get_level_values(0) < midx.get_level_values(1)]]
+            [df.iloc[idx_1].add_suffix('_1').set_axis(midx),
+             df.iloc[idx_2].add_suffix('_2').set_axis(midx)], axis=1)
+        return pair
 
 
 class Yolo4Reader(IPredReader):
     def read(self, src):
         log.info("Reading from yolov4 pred: %s", src)
-        with open(src, 'r') as f:
-            yolo_json = json.load(f)
-
-        return (
-            pd.json_normalize(yolo_json[0]['objects'])  # image has one frame only
-                .rename(columns={"relative_coordinates.center_x": "center_x",
-                                 "relative_coordinates.center_y": "center_y",
-                                 "relative_coordinates.width": "width",
-                                 "relative_coordinates.height" :"height"})
-                .drop(columns=['class_id'])
-        )
+        yolo_json = json_loads(pathlib.Path(src).read_bytes())
+
+        objs = yolo_json[0]['objects']  # image has one frame only
+        coords = [obj['relative_coordinates'] for obj in objs]
+        return pd.DataFrame({
+            'name': [obj['name'] for obj in objs],
+            'confidence': [obj['confidence'] for obj in objs],
+            'center_x': [c['center_x'] for c in coords],
+            'center_y': [c['center_y'] for c in coords],
+            'width': [c['width'] for c in coords],
+            'height': [c['height'] for c in coords],
+        })
 
 class Yolo5Reader(IPredReader):
     def read(self, src):
@@ -342,28 +422,22 @@ class Assigner(IAssigner):
         self._drop_core_duplicates()
         self._assign_core_objs()
 
-        remaining = self._list_remaining_objs()
-        while not remaining.empty and self._hands_to_assign():
-            obj_idx, hand, distance = self._find_closest_obj(remaining)
-            if distance > self.MAX_ASSIGNMENT_DISTANCE:
-                break  # stop if card too far away from the assigning hand
-
-            self._assign_one_obj(obj_idx, hand)
-            remaining = self._drop_assigned(obj_idx, remaining)
+        while self._assign_remaining_objs():
+            pass  # hands grow each round -> more remaining objs may come within reach
 
         assigned_cards = self.list_assigned_cards()
         return assigned_cards
 
     #
     def _load(self, transformed_cards):
-        self.objs = pd.DataFrame(transformed_cards)
+        self.objs = pd.DataFrame(transformed_cards).astype({'name': CARD_DTYPE})
 
     def _divide_to_quadrants(self):
         """Divide cards to four quadrants before finding the core objs in each."""
         self.objs = (
             self.objs
                 .pipe(self._mark_marginal, width=self.QUADRANT_MARGIN_WIDTH)
-                .assign(quadrant=lambda df: df.apply(self._calc_quadrant, axis=1))
+                .assign(quadrant=self._calc_quadrant)
         )
         log.debug("Divided to quadrants with %s marginal cards.",
                   self.objs.query("quadrant == 'margin'").shape[0])
@@ -423,46 +497,57 @@ class Assigner(IAssigner):
         hand_size = self.objs.hand.value_counts()
         return hand_size[hand_size < 13].index.tolist()
 
-    def _find_closest_obj(self, remaining: pd.DataFrame) -> Tuple[int, str]:
-        """Find the closest obj to any of the *qualified hands*.
-
-        Qualification: each hand can have 13 objects at most."""
-        min_distance = 2  # large enough assuming coordinates are in (0, 1)
-        closest_obj_idx = None
-        closest_hand = None
-        for hand in self._hands_to_assign():
-            _hand_cards = self.objs[self.objs.hand == hand]
-            hand_coords = list(_hand_cards[["center_x", "center_y"]].itertuples(index=False))
-
-            for obj_idx, x, y in remaining[["center_x", "center_y"]].itertuples():
-                distance = self.linkage.calc_distance(x, y, hand_coords)
-                if distance < min_distance:
-                    min_distance = distance
-                    closest_obj_idx = obj_idx
-                    closest_hand = hand
-
-        closest_obj = remaining.loc[closest_obj_idx, ["name", "quadrant"]].to_dict()
-        log.debug(
-            "Found a closest obj(%s) to '%s': %s",
-            closest_obj, closest_hand, min_distance)
-
-        return closest_obj_idx, closest_hand, min_distance
-
-    def _assign_one_obj(self, obj_idx, hand):
-        """Assign object to `hand`, by updating col 'hand'."""
-        assert obj_idx in self.objs.index, f"{obj_idx} not found in `card_.index`!"
-        self.objs.at[obj_idx, 'hand'] = hand
-
-    def _drop_assigned(self, obj_idx, remaining: pd.DataFrame) -> pd.DataFrame:
-        """Drop assigned object(s) from `remaining`."""
-        _assigned_name = remaining.at[obj_idx, 'name']
-        assigned_cards = remaining[remaining.name == _assigned_name]
-
-        log.debug(
-            "Dropping %s assigned cards: %s",
-            len(assigned_cards),
-            assigned_cards[["name", "quadrant"]].to_dict("records"))
-        return remaining.drop(index=assigned_cards.index)
+    def _assign_remaining_objs(self) -> int:
+        """Assign remaining objs to the *qualified hands* at once, minimizing total distance.
+
+        Qualification: each hand can have 13 objects at most, so each hand is expanded
+        into one slot per missing card, and slots are filled by solving a linear sum
+        assignment (Hungarian) problem. Dups of a card name compete as one row, using
+        whichever obj is closest to each hand.
+
+        Return the number of objs assigned."""
+        remaining = self._list_remaining_objs()
+        assigned_names = self.objs.loc[self.objs.hand.notna(), 'name']
+        remaining = remaining[~remaining.name.isin(assigned_names)]  # dups of assigned cards
+
+        hands = self._hands_to_assign()
+        if remaining.empty or not hands:
+            return 0
+
+        name_dist, name_obj_idx = self._calc_name_hand_distances(remaining, hands)
+
+        hand_size = self.objs.hand.value_counts()
+        slot_hands = np.repeat(np.array(hands, dtype=object), [13 - hand_size[hand] for hand in hands])
+        cost = name_dist[slot_hands].to_numpy()
+
+        # too far away from the hand -> only picked as last resort, then skipped below
+        too_far = cost > self.MAX_ASSIGNMENT_DISTANCE
+        cost[too_far] = len(cost) * self.MAX_ASSIGNMENT_DISTANCE + 1
+
+        n_assigned = 0
+        for row, col in zip(*scipy.optimize.linear_sum_assignment(cost)):
+            if too_far[row, col]:
+                continue
+            hand = slot_hands[col]
+            obj_idx = name_obj_idx.at[name_dist.index[row], hand]
+            self.objs.at[obj_idx, 'hand'] = hand
+            n_assigned += 1
+
+        log.debug("Assigned %s of %s remaining card names", n_assigned, len(name_dist))
+        return n_assigned
+
+    def _calc_name_hand_distances(self, remaining: pd.DataFrame, hands: List[str]):
+        """Return (name x hand) distances of the closest obj per name, and that obj's index."""
+        remaining_coords = remaining[["center_x", "center_y"]].to_numpy()
+        obj_dist = pd.DataFrame(
+            {hand: self.linkage.calc_distances(
+                remaining_coords,
+                self.objs.loc[self.objs.hand == hand, ["center_x", "center_y"]].to_numpy())
+             for hand in hands},
+            index=remaining.index)
+
+        by_name = obj_dist.groupby(remaining.name, sort=False, observed=True)
+        return by_name.min(), by_name.idxmin()
 
     def list_assigned_cards(self):
         assigned_objs = self.objs.loc[~self.objs.hand.isna()]
@@ -474,35 +559,26 @@ class Assigner(IAssigner):
         """Mark a card as marginal based on (x, y).
 
         OK to ignore the top-left positioned origin, due to symmetricity.
+        Borders are the two diagonals, i.e. lines y = x and x + y = 1.
         """
-        bottom_l, top_r = (0, 0), (1, 1)
-        bottom_r, top_l = (1, 0), (0, 1)
-
-        def _calc_dist_to_border(row: pd.Series):
-            p = (row.center_x, row.center_y)
-            dist1 = util.point_line_dist(p, bottom_l, top_r)
-            dist2 = util.point_line_dist(p, bottom_r, top_l)
-            return min(dist1, dist2)
-
-        return (card.assign(_dist_to_border=card.apply(_calc_dist_to_border, axis=1))
-                    .assign(is_marginal=lambda df: df._dist_to_border <= width)
-                    .drop(columns="_dist_to_border"))
+        x, y = card.center_x.values, card.center_y.values
+        dist_to_border = np.minimum(np.abs(x - y), np.abs(1 - x - y)) / np.sqrt(2)
+        return card.assign(is_marginal=dist_to_border <= width)
 
     @staticmethod
-    def _calc_quadrant(c: pd.Series):
+    def _calc_quadrant(card: pd.DataFrame) -> np.ndarray:
         """Determine quadrant of cards based on (x, y) and whether marginal."""
-        if c.is_marginal:
-            return MARGIN
+        x, y = card.center_x.values, card.center_y.values
 
         # Note: origin is at top left corner, instead of bottom left
-        if c.center_y > c.center_x and 1 - c.center_y < c.center_x:
-            return QUADRANT_BOTTOM
-        if c.center_y < c.center_x and 1 - c.center_y > c.center_x:
-            return QUADRANT_TOP
-        if c.center_y < c.center_x and 1 - c.center_y < c.center_x:
-            return QUADRANT_RIGHT
-        if c.center_y > c.center_x and 1 - c.center_y > c.center_x:
-            return QUADRANT_LEFT
+        return np.select(
+            [card.is_marginal.values,
+             (y > x) & (1 - y < x),
+             (y < x) & (1 - y > x),
+             (y < x) & (1 - y < x),
+             (y > x) & (1 - y > x)],
+            [MARGIN, QUADRANT_BOTTOM, QUADRANT_TOP, QUADRANT_RIGHT, QUADRANT_LEFT],
+            default=None)
 
     def _find_quadrant_core_objs(self, quadrant) -> pd.Series:
         """Find core objects for a specific quadrant"""
@@ -524,6 +600,18 @@ def get_deal_converter(reader=Yolo4Reader()) -> DealConverter:
     return deal_converter
 
 
+def validate_full_deal(assigned_cards):
+    """Check assigned cards make up a full deal: all 52 cards once, 13 for each player."""
+    names = [card['name'] for card in assigned_cards]
+    if len(names) != len(CARD_CLASSES) or set(names) != set(CARD_CLASSES):
+        raise ValueError(f"Expected each of the {len(CARD_CLASSES)} cards once, "
+                         f"got {len(names)} cards ({len(set(names))} distinct)")
+
+    hand_counts = collections.Counter(card['hand'] for card in assigned_cards)
+    if any(hand_counts[hand] != 13 for hand in HAND_SHORTNAME_MAP):
+        raise ValueError(f"Expected 13 cards for each player, got {dict(hand_counts)}")
+
+
 def _get_assigner() -> IAssigner:
     dbscan = strategy.CoreFinderDbscanPy()
     single_linkage = strategy.SingleLinkage()
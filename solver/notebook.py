@@ -17,13 +17,11 @@
 # %autoreload 2
 
 import json
-import importlib
 import pathlib
 
 import matplotlib.pyplot as plt
 import numpy as np
 import pandas as pd
-import sympy
 
 import converter
 import strategy
@@ -66,15 +64,15 @@ res.shape
 
 # %%
 def _make_pair_wise(df: pd.DataFrame):
-    midx = pd.MultiIndex.from_product([df.index, df.index], names=['n1', 'n2'])
+    idx_1, idx_2 = np.triu_indices(len(df), k=1)
+    midx = pd.MultiIndex.from_arrays([df.index[idx_1], df.index[idx_2]], names=['n1', 'n2'])
     pair = pd.concat(
-        [df.add_suffix('_1').reindex(midx, level='n1'),
-         df.add_suffix('_2').reindex(midx, level='n2')], axis=1)
-    return pair.loc[
-        midx[midx.get_level_values(0) < midx.get_level_values(1)]]
+        [df.iloc[idx_1].add_suffix('_1').set_axis(midx),
+         df.iloc[idx_2].add_suffix('_2').set_axis(midx)], axis=1)
+    return pair
 
 def _euclidean_dist(x1, y1, x2, y2):
-    return np.sqrt((x1-x2)**2 + (y1-y2)**2)
+    return np.hypot(x1 - x2, y1 - y2)
 
 
 # %%
@@ -93,9 +91,7 @@ dist = (
         .drop(columns=['group_rank']).set_index('uniq_name')
         .pipe(_make_pair_wise)
         .query('name_1 == name_2')
-        .assign(dist_=lambda df: df.apply(
-            lambda df: _euclidean_dist(df.x_1, df.y_1, df.x_2, df.y_2),
-            axis=1))
+        .assign(dist_=lambda df: _euclidean_dist(df.x_1, df.y_1, df.x_2, df.y_2))
         .sort_index()
 )
 dist.shape
@@ -271,17 +267,9 @@ def mark_marginal(card: pd.DataFrame, margin):
 
     OK to ignore the top-left positioned origin, due to symmetricity.
     """
-    line_up = sympy.Line((0, 0), (1, 1))
-    line_dn = sympy.Line((0, 1), (1, 0))
-
-    def _calc_dist_to_border(row: pd.Series):
-        dist1 = float(line_up.distance((row.center_x, row.center_y)).evalf())
-        dist2 = float(line_dn.distance((row.center_x, row.center_y)).evalf())
-        return min(dist1, dist2)
-
-    return (card.assign(_dist_to_border=card.apply(_calc_dist_to_border, axis=1))
-                .assign(is_marginal=lambda df: df._dist_to_border <= margin)
-                .drop(columns="_dist_to_border"))
+    x, y = card.center_x.values, card.center_y.values
+    dist_to_border = np.minimum(np.abs(x - y), np.abs(1 - x - y)) / np.sqrt(2)
+    return card.assign(is_marginal=dist_to_border <= margin)
 
 
 def divide_quardrants(card: pd.DataFrame, margin=0):
@@ -335,10 +323,11 @@ dconv.card_.shape
 
 # %%
 dconv._assign_core_objs()
-remaining = dconv._list_remaining_objs()
+dconv._list_remaining_objs()
 # GOOD
 
-dconv._find_closest_obj(remaining)
+while dconv._assign_remaining_objs():
+    pass  # one linear sum assignment per round
 # GOOD
 
 # %% [markdown]
@@ -401,10 +390,11 @@ dconv.card_.shape
 
 # %%
 dconv._assign_core_objs()
-remaining = dconv._list_remaining_objs()
+dconv._list_remaining_objs()
 # GOOD
 
-dconv._find_closest_obj(remaining)
+while dconv._assign_remaining_objs():
+    pass  # one linear sum assignment per round
 # GOOD
 
 # %% [markdown]
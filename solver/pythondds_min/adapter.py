@@ -1,8 +1,10 @@
 """Helpers as extensions to pythondds_min/functions.py"""
 import contextlib
 import ctypes
+import functools
 import io
 import logging as log
+from typing import List
 
 import numpy as np
 import pandas as pd
@@ -13,28 +15,59 @@ from . import hands
 
 
 THREADS_EQUAL_TO_CORES = 0
+MAX_TABLES_PER_CALL = dds.MAXNOOFBOARDS // dds.DDS_STRAINS  # CalcAllTables limit with no strain filtered
 
 
 PbnHand = bytes
 
 
+@functools.lru_cache(maxsize=None)
+def init_threads(n_threads=THREADS_EQUAL_TO_CORES):
+    """Set up DDS threads & their memory once; calling SetMaxThreads again reallocates them."""
+    log.debug("Setting DDS max threads: %s", n_threads)
+    dds.SetMaxThreads(n_threads)
+
+
 def solve_hand(hand: PbnHand):
     deal = _init_deal(hand)
     result = _init_result()
 
     # call CalcDDtablePBN
     log.debug("Calculating DDTable..")
-    dds.SetMaxThreads(THREADS_EQUAL_TO_CORES)
+    init_threads()
     ret_code = dds.CalcDDtablePBN(deal, result)
-
-    if ret_code != dds.RETURN_NO_FAULT:
-        msg = ctypes.create_string_buffer(80)
-        dds.ErrorMessage(ret_code, msg)
-        log.error("DDS error: %s", msg)
+    _check_ret_code(ret_code)
 
     return result
 
 
+def solve_hands(hands: List[PbnHand]) -> list:
+    """Batch version of `solve_hand()`: DDS solves up to `MAX_TABLES_PER_CALL` deals per call."""
+    init_threads()
+    no_par = -1
+    all_strains = (ctypes.c_int * dds.DDS_STRAINS)(*[0] * dds.DDS_STRAINS)
+
+    results = []
+    for start in range(0, len(hands), MAX_TABLES_PER_CALL):
+        batch = hands[start:start+MAX_TABLES_PER_CALL]
+        deals = dds.ddTableDealsPBN()
+        deals.noOfTables = len(batch)
+        for deal_obj, hand in zip(deals.deals, batch):
+            deal_obj.cards = hand
+        tables_res = dds.ddTablesRes()
+        par_res = dds.allParResults()
+
+        log.debug("Calculating %s DDTables..", len(batch))
+        ret_code = dds.CalcAllTablesPBN(
+            ctypes.pointer(deals), no_par, all_strains, ctypes.pointer(tables_res), ctypes.pointer(par_res))
+        _check_ret_code(ret_code)
+
+        # same pointer type as `solve_hand()` results; each keeps `tables_res` alive
+        results.extend(ctypes.pointer(tables_res.results[i]) for i in range(len(batch)))
+
+    return results
+
+
 def calc_par(result: dds.ddTableResults, vul=hands.VUL_NONE):
     par_result = _init_par_result()
     dds.Par(result, par_result, vul)
@@ -71,6 +104,13 @@ def format_result(result: dds.ddTableResults):
     return formatted_result
 
 
+def _check_ret_code(ret_code):
+    if ret_code != dds.RETURN_NO_FAULT:
+        msg = ctypes.create_string_buffer(80)
+        dds.ErrorMessage(ret_code, msg)
+        log.error("DDS error: %s", msg)
+
+
 def _init_deal(hand: PbnHand):
     deal_obj = dds.ddTableDealPBN()
     deal_obj.cards = hand
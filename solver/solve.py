@@ -1,7 +1,9 @@
 """Solver interfaces/Classes used by app."""
 import abc
-import collections
+import concurrent.futures
 import dataclasses
+import functools
+import io
 import logging
 import typing as T
 
@@ -13,19 +15,95 @@ import solver.pythondds_min.adapter as dds_adapter
 lgr = logging
 
 CardName = str
-CardAssignment = T.List[T.Dict]
+CardAssignment = T.List[converter.CardTuple]
 TransformedCards = T.List[T.Dict]  # see outputs of converter.IPredReader
 AssignedCards = T.List[T.Dict]
 
+# hand as 16 rank bitmasks, one per (player, suit), see MonoStringPresenter
+_PLAYER_IDX = {converter.HAND_N: 0, converter.HAND_E: 1, converter.HAND_S: 2, converter.HAND_W: 3}
+_SUIT_IDX = {converter.SUIT_S: 0, converter.SUIT_H: 1, converter.SUIT_D: 2, converter.SUIT_C: 3}
+_MONO_RANKS = [('T' if r == '10' else r) for r in reversed(converter.RANKS)]  # '2', .., 'A'
+_RANK_BIT = {r: 1 << i for i, r in enumerate(reversed(converter.RANKS))}  # '2' -> 1, .., 'A' -> 1<<12
+_SYMBOL_MAP = {
+    converter.SUIT_S: '\u2660',
+    converter.SUIT_H: '\u2661',
+    converter.SUIT_D: '\u2662',
+    converter.SUIT_C: '\u2663',
+}
+
+
+def _mask_index(player, color):
+    return (_PLAYER_IDX[player] << 2) | _SUIT_IDX[color]
+
+
+@functools.lru_cache(maxsize=None)  # longest suits are 4..13 cards -> few combos
+def _compute_widths(ew_longest, ns_longest, square_width):
+    """Row width & suit widths of the mono hand (see `MonoStringPresenter._format_hand()`)."""
+    ew_row_min_width = ew_longest*2 + square_width + 2  # padding
+    ns_row_min_width = ns_longest*2 - square_width
+
+    width = max(ew_row_min_width, ns_row_min_width)
+
+    ew_suit_width = (width-square_width-2) // 2
+    ns_suit_width = square_width + 1 + ew_suit_width
+    return width, ew_suit_width, ns_suit_width
+
+
+@functools.lru_cache(maxsize=1024)  # a deal has 16 suits -> repeated renders are lookups
+def _mask_to_ranks(mask: int) -> str:
+    """Mono ranks of a suit bitmask, highest first, e.g. 0b1000000000101 -> 'A42'."""
+    ranks = []
+    while mask:
+        hi = mask.bit_length() - 1
+        ranks.append(_MONO_RANKS[hi])
+        mask ^= 1 << hi
+    return ''.join(ranks)
+
+
+# one long-lived worker keeps DDS (which releases the GIL) off the UI thread, with its state warm
+_DDS_EXECUTOR = concurrent.futures.ThreadPoolExecutor(
+    max_workers=1, thread_name_prefix='dds', initializer=dds_adapter.init_threads)
+
+
+@functools.lru_cache(maxsize=128)
+def _intern_pbn(pbn_hand: dds_adapter.PbnHand) -> dds_adapter.PbnHand:
+    """Return the first-seen equal pbn hand, so solutions of the same deal share one object.
+
+    `sys.intern()` only takes `str`, while pbn hands are bytes."""
+    return pbn_hand
+
+
+@functools.lru_cache(maxsize=128)
+def _solve_hand(pbn_hand: dds_adapter.PbnHand):
+    """DDS result only depends on the deal -> solve each distinct pbn hand once."""
+    return dds_adapter.solve_hand(pbn_hand)
+
 
 # Abstract #
 
 @dataclasses.dataclass
 class Solution():
     hand: object
-    hand_dict: CardAssignment
+    hand_dict: CardAssignment  # a full deal, validated in `DealConverter.format_pbn_and_cards()`
     dds_result: object
 
+    # formatted views, computed on first use then shared by presenters
+    @functools.cached_property
+    def formatted_hand(self) -> str:
+        return dds_adapter.format_hand(self.hand)
+
+    @functools.cached_property
+    def formatted_dd_result(self) -> str:
+        return dds_adapter.format_result(self.dds_result)
+
+    @functools.cached_property
+    def par_result(self):
+        return dds_adapter.calc_par(self.dds_result)  # from the table at hand, never re-solves
+
+    @functools.cached_property
+    def formatted_par(self) -> str:
+        return dds_adapter.format_par(self.par_result)
+
 
 @dataclasses.dataclass
 class TransformationResults:
@@ -75,9 +153,9 @@ class BridgeSolverBase(abc.ABC):
 
 # Impl. #
 class BridgeSolver(BridgeSolverBase):
-    def __init__(self, detection, presenter) -> None:
-        super().__init__(detection, presenter)
-        self.converter = converter.get_deal_converter(reader=converter.Yolo5Reader())
+    @functools.cached_property
+    def converter(self):  # only built once the flow gets to transform/assign
+        return converter.get_deal_converter(reader=converter.Yolo5Reader())
 
     def transform(self) -> TransformationResults:
         self.converter.read(self.detection)
@@ -104,38 +182,56 @@ class BridgeSolver(BridgeSolverBase):
         return assignment_results
 
     def solve(self, assigned_cards: AssignedCards):
-        pbn_hand = self.converter.format_pbn(assigned_cards)
+        self.solve_async(assigned_cards).result()
 
-        dds_result = dds_adapter.solve_hand(pbn_hand)
-        lgr.debug("Got DDS result for pbn hand: %s", pbn_hand)
+    def solve_async(self, assigned_cards: AssignedCards) -> 'concurrent.futures.Future[Solution]':
+        """Same as `solve()` but runs DDS in the background; the future resolves to `solution_`."""
+        pbn_hand, hand_dict = self.converter.format_pbn_and_cards(assigned_cards)
+        pbn_hand = _intern_pbn(pbn_hand.strip())
 
-        self.solution_ = Solution(
-            hand=pbn_hand,
-            hand_dict=self.converter.list_assigned_cards(),
-            dds_result=dds_result,
-        )
+        def _solve():
+            dds_result = _solve_hand(pbn_hand)
+            lgr.debug("Got DDS result for pbn hand: %s", pbn_hand)
+
+            self.solution_ = Solution(
+                hand=pbn_hand,
+                hand_dict=hand_dict,
+                dds_result=dds_result,
+            )
+            return self.solution_
+
+        return _DDS_EXECUTOR.submit(_solve)
+
+    def solve_many(self, assigned_cards_list: T.List[AssignedCards]) -> T.List[Solution]:
+        """Solve several deals with batched DDS calls, e.g. for regression runs.
+
+        Unlike `solve()`, `solution_` is left as is."""
+        formatted = [self.converter.format_pbn_and_cards(cards) for cards in assigned_cards_list]
+        pbn_hands = [_intern_pbn(pbn_hand.strip()) for pbn_hand, _ in formatted]
+
+        dds_results = _DDS_EXECUTOR.submit(dds_adapter.solve_hands, pbn_hands).result()
+        lgr.debug("Got DDS results for %s pbn hands", len(pbn_hands))
+
+        return [Solution(hand=pbn_hand, hand_dict=hand_dict, dds_result=dds_result)
+                for pbn_hand, (_, hand_dict), dds_result in zip(pbn_hands, formatted, dds_results)]
 
 
 class StringPresenter(IPresenter):
     def present(self, solution: Solution):
-        formatted_hand = dds_adapter.format_hand(solution.hand)
-
-        formatted_dd_result = dds_adapter.format_result(solution.dds_result)
-        return formatted_hand, formatted_dd_result
+        return solution.formatted_hand, solution.formatted_dd_result
 
 
 class MonoStringPresenter(IPresenter):
-    S, H, D, C = '\u2660', '\u2661', '\u2662', '\u2663'
-    SYMBOL_MAP = {
-        converter.SUIT_S: S,
-        converter.SUIT_H: H,
-        converter.SUIT_D: D,
-        converter.SUIT_C: C,
-    }
+    SYMBOL_MAP = _SYMBOL_MAP
+    S, H, D, C = (_SYMBOL_MAP[suit] for suit in (converter.SUIT_S, converter.SUIT_H,
+                                                 converter.SUIT_D, converter.SUIT_C))
     HORI, VERT = '\u2500', '\u2502'
     TL, TR, BL, BR = '\u250c', '\u2510', '\u2514', '\u2518'
 
     SQUARE_WIDTH = 6
+    T_BAR = TL+HORI*4+TR
+    H_BAR = VERT+' '*4+VERT
+    B_BAR = BL+HORI*4+BR
 
     def present(self, solution: Solution):
         formatted_hand = self._format_hand(solution.hand_dict)
@@ -163,66 +259,41 @@ class MonoStringPresenter(IPresenter):
 
         Leading & trailing spaces are important to ensure nice display in center-aligned text boxes.
         See method `_align_l_r()` below."""
-        assert len(hand) == 52
-
         # Extract cards
-        suit_map = collections.defaultdict(list)  # 'northd' -> list of cards
+        masks = [0] * 16  # _mask_index(player, color) -> bitmask of ranks
+        player_idx, suit_idx, rank_bit = _PLAYER_IDX, _SUIT_IDX, _RANK_BIT
         for card in hand:
-            player = card['hand']
-            color, rank = card['name'][-1], card['name'][:-1]
-            suit_map[player+color].append(rank)
-
-        # Calc widths
-        e_longest = self._longest_len(suit_map, converter.HAND_E) + 1  # for symbol
-        w_longest = self._longest_len(suit_map, converter.HAND_W) + 1  # for symbol
-        ew_longest = max(e_longest, w_longest)
-        ew_row_min_width = ew_longest*2 + self.SQUARE_WIDTH + 2  # padding
-
-        n_longest = self._longest_len(suit_map, converter.HAND_N) + 1  # for symbol
-        s_longest = self._longest_len(suit_map, converter.HAND_S) + 1  # for symbol
-        ns_longest = max(n_longest, s_longest)
-        ns_row_min_width = ns_longest*2 - self.SQUARE_WIDTH
+            masks[(player_idx[card.player] << 2) | suit_idx[card.suit]] |= rank_bit[card.rank]
 
-        width = max(ew_row_min_width, ns_row_min_width)
-
-        ew_suit_width = (width-self.SQUARE_WIDTH-2) // 2
-        ns_suit_width = self.SQUARE_WIDTH + 1 + ew_suit_width
-
-        # Format hand row by row
-        rows = []
-        rows.append(self._format_align_suit(suit_map, 'north', 's', ns_suit_width, width))
-        rows.append(self._format_align_suit(suit_map, 'north', 'h', ns_suit_width, width))
-        rows.append(self._format_align_suit(suit_map, 'north', 'd', ns_suit_width, width))
-        rows.append(self._format_align_suit(suit_map, 'north', 'c', ns_suit_width, width))
-
-        t_bar = self.TL+self.HORI*4+self.TR
-        h_bar = self.VERT+' '*4+self.VERT
-        b_bar = self.BL+self.HORI*4+self.BR
-
-        ws = self._format_align_suit(suit_map, 'west', 's', w_longest, ew_suit_width)
-        es = self._format_align_suit(suit_map, 'east', 's', ew_suit_width, ew_suit_width)
-        rows.append(' '.join([ws, t_bar, es]))
-
-        wh = self._format_align_suit(suit_map, 'west', 'h', w_longest, ew_suit_width)
-        eh = self._format_align_suit(suit_map, 'east', 'h', ew_suit_width, ew_suit_width)
-        rows.append(' '.join([wh, h_bar, eh]))
-
-        wd = self._format_align_suit(suit_map, 'west', 'd', w_longest, ew_suit_width)
-        ed = self._format_align_suit(suit_map, 'east', 'd', ew_suit_width, ew_suit_width)
-        rows.append(' '.join([wd, h_bar, ed]))
-
-        wc = self._format_align_suit(suit_map, 'west', 'c', w_longest, ew_suit_width)
-        ec = self._format_align_suit(suit_map, 'east', 'c', ew_suit_width, ew_suit_width)
-        rows.append(' '.join([wc, b_bar, ec]))
-
-        rows.append(self._format_align_suit(suit_map, 'south', 's', ns_suit_width, width))
-        rows.append(self._format_align_suit(suit_map, 'south', 'h', ns_suit_width, width))
-        rows.append(self._format_align_suit(suit_map, 'south', 'd', ns_suit_width, width))
-        rows.append(self._format_align_suit(suit_map, 'south', 'c', ns_suit_width, width))
-        rows.append('')  # avoid newline issue
-
-        lgr.debug("deal string width to present: %s", len(rows[0]))
-        return '\n'.join(rows)
+        # Calc widths, from each player's longest suit (+1 for symbol)
+        n_longest, e_longest, s_longest, w_longest = (
+            max(bin(mask).count('1') for mask in masks[start:start+4]) + 1
+            for start in range(0, 16, 4)  # _PLAYER_IDX order
+        )
+        width, ew_suit_width, ns_suit_width = _compute_widths(
+            max(e_longest, w_longest), max(n_longest, s_longest), self.SQUARE_WIDTH)
+
+        t_bar, h_bar, b_bar = self.T_BAR, self.H_BAR, self.B_BAR
+
+        # Format hand row by row, straight into one buffer
+        buf = io.StringIO()
+        write, format_align_suit = buf.write, self._format_align_suit
+        for color in 'shdc':
+            write(format_align_suit(masks, 'north', color, ns_suit_width, width))
+            write('\n')
+        for color, bar in zip('shdc', (t_bar, h_bar, h_bar, b_bar)):
+            write(format_align_suit(masks, 'west', color, w_longest, ew_suit_width))
+            write(' ')
+            write(bar)
+            write(' ')
+            write(format_align_suit(masks, 'east', color, ew_suit_width, ew_suit_width))
+            write('\n')
+        for color in 'shdc':
+            write(format_align_suit(masks, 'south', color, ns_suit_width, width))
+            write('\n')  # trailing newline avoids newline issue
+
+        lgr.debug("deal string width to present: %s", width)
+        return buf.getvalue()
 
     def _format_result(self, dds_result) -> str:
         records = dds_adapter.result_to_records(dds_result)
@@ -242,36 +313,23 @@ class MonoStringPresenter(IPresenter):
 
         return '\n'.join(rows)
 
-    def _longest_len(self, suit_map, player):
-        player_suits = (suit for pc, suit in suit_map.items() if pc.startswith(player))
-        return max(len(s) for s in player_suits)
-
-    def _format_align_suit(self, suit_map, player, color, suit_width, total_width):
-        formatted_suit = self._format_suit(suit_map, player, color)
+    def _format_align_suit(self, masks, player, color, suit_width, total_width):
+        formatted_suit = self._format_suit(masks, player, color)
         aligned_suit = self._align_l_r(formatted_suit, suit_width, total_width)
         return aligned_suit
 
-    def _format_suit(self, suit_map, player, color):
-        cards = suit_map[player+color]
-        sorted_cards = sorted(cards, key=converter.RANKS.index)
-        mono_cards = ''.join('T' if c == '10' else c for c in sorted_cards) or '-'  # void
-        formatted_suit = f'{self.SYMBOL_MAP[color]}{mono_cards}'
+    def _format_suit(self, masks, player, color):
+        mono_cards = _mask_to_ranks(masks[_mask_index(player, color)]) or '-'  # void
+        formatted_suit = f'{_SYMBOL_MAP[color]}{mono_cards}'
         return formatted_suit
 
     def _align_l_r(self, text, self_width, total_width):
         """Align left then right, to ensure nice display for center-aligned text box."""
-        left_aligned = f'{{:<{self_width}}}'.format(text)
-        left_right_aligned = f'{{:>{total_width}}}'.format(left_aligned)
-        return left_right_aligned
+        return text.ljust(self_width).rjust(total_width)
 
 
 class PrintPresenter(IPresenter):  # TODO ideally have another separate `View` and this only transforms
     def present(self, solution: Solution):
-        formatted_hand = dds_adapter.format_hand(solution.hand)
-        print(formatted_hand)
-
-        formatted_dd_result = dds_adapter.format_result(solution.dds_result)
-        print(formatted_dd_result)
-
-        par_result = dds_adapter.calc_par(solution.dds_result)
-        print(dds_adapter.format_par(par_result))
+        print(solution.formatted_hand)
+        print(solution.formatted_dd_result)
+        print(solution.formatted_par)
@@ -39,10 +39,20 @@ class ILinkage(abc.ABC):
         """Calculate distance between a single point (x, y) and `coords`."""
         pass
 
+    @abc.abstractmethod
+    def calc_distances(self, coords: np.ndarray, other_coords: np.ndarray) -> np.ndarray:
+        """Calculate distances between each point of `coords` (N, 2) and `other_coords` (M, 2).
+
+        Vectorized `calc_distance`, returning an array of shape (N,)."""
+        pass
+
     def _calc_pointwise_distances(self, x, y, coords: Iterable[Coord]):
         return [scipy.spatial.distance.euclidean([x, y], [x2, y2])
                 for x2, y2 in coords]
 
+    def _calc_pairwise_distances(self, coords: np.ndarray, other_coords: np.ndarray):
+        return scipy.spatial.distance.cdist(coords, other_coords)
+
 
 class SingleLinkage(ILinkage):
     """Single Linkage (SL) calcs distance using the closest point."""
@@ -50,3 +60,7 @@ class SingleLinkage(ILinkage):
     def calc_distance(self, x, y, coords: Iterable):
         pointwise_distances = self._calc_pointwise_distances(x, y, coords)
         return min(pointwise_distances)
+
+    def calc_distances(self, coords: np.ndarray, other_coords: np.ndarray) -> np.ndarray:
+        pairwise_distances = self._calc_pairwise_distances(coords, other_coords)
+        return pairwise_distances.min(axis=1)
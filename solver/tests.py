@@ -1,11 +1,13 @@
 import pathlib
 
+import numpy as np
 import pandas as pd
 import pytest
 
 from solver.pythondds_min import adapter
 from solver.pythondds_min import calc_ddtable_pbn
 from . import converter
+from . import dbscan
 from . import main
 
 
@@ -24,6 +26,24 @@ def pbn_hand() -> bytes:
     return b'W:9432.AT72.K98.JT KQ65.KJ.A52.9632 7.Q86.QJ763.AK84 AJT8.9543.T4.Q75'
 
 
+def pbn_to_cards(pbn_hand: bytes):
+    cards = []
+    for player, hand in zip(['west', 'north', 'east', 'south'], pbn_hand.decode()[2:].split()):
+        for suit, ranks in zip('shdc', hand.split('.')):
+            cards.extend({'name': f"{'10' if r == 'T' else r}{suit}", 'hand': player} for r in ranks)
+    return cards
+
+
+@pytest.fixture(scope='module')
+def assigned_cards(pbn_hand: bytes):
+    return pbn_to_cards(pbn_hand)
+
+
+@pytest.fixture(scope='module')
+def solve():
+    return pytest.importorskip('solver.solve')  # pulls in detector deps
+
+
 class TestBasic:
     def test_min_sample_run(self, capsys):
         calc_ddtable_pbn.main()
@@ -116,6 +136,35 @@ class TestConverter:
         formatted_suit = deal_converter._build_pbn_suit(card_names, "d")
         assert formatted_suit == ""
 
+    def test_make_pair_wise(self, deal_converter: converter.DealConverter):
+        df = pd.DataFrame({'name': ['5c', '5c', '9h'], 'x': [0.1, 0.2, 0.3]},
+                          index=pd.Index(['5c_1', '5c_2', '9h_1'], name='uniq_name'))
+
+        pair = deal_converter._make_pair_wise(df)
+
+        assert pair.shape == (3, 4)
+        assert pair.columns.tolist() == ['name_1', 'x_1', 'name_2', 'x_2']
+        assert pair.index.tolist() == [('5c_1', '5c_2'), ('5c_1', '9h_1'), ('5c_2', '9h_1')]
+        assert pair.at[('5c_1', '9h_1'), 'x_2'] == 0.3
+
+    @pytest.mark.parametrize('dists', [
+        [0.2, 0.205, 0.12, 0.21, 0.3, 0.214, 0.125],  # one cluster among outliers
+        [0.25, 0.15, 0.253, 0.152, 0.256, 0.154],  # tie -> cluster of the first core point
+        [0.15, 0.25, 0.152, 0.253, 0.154, 0.256],
+        [0.2053, 0.3027, 0.2095, 0.3023, 0.3036, 0.2179],  # tie, first value only a border point
+        [0.3, 0.301, 0.302, 0.1, 0.101, 0.102, 0.103],  # cluster seen first, not the largest
+        [0.2, 0.3],  # too few points
+        [0.2],
+    ])
+    def test_find_densest(self, deal_converter: converter.DealConverter, dists):
+        # previous implementation: cluster 1 of the pure-py dbscan
+        clt_id = dbscan.dbscan(np.array(dists).reshape(1, -1), eps=0.01, min_points=3)
+        expected = sorted(d for d, c in zip(dists, clt_id) if c == 1)
+
+        densest = deal_converter._find_densest(dists)
+
+        assert densest.tolist() == expected
+
     def test_build_pbn_deal(self, deal_converter: converter.DealConverter, transformed_cards):
         assigned_cards = deal_converter.assign(transformed_cards)
         deal_converter.card_ = pd.DataFrame(assigned_cards)  # not best practice
@@ -126,6 +175,31 @@ class TestConverter:
         expected = 'W:9432.AT72.K98.JT KQ65.KJ.A52.9632 7.Q86.QJ763.AK84 AJT8.9543.T4.Q75'
         assert formatted_deal == expected
 
+    def test_format_pbn_and_cards(self, deal_converter: converter.DealConverter, transformed_cards,
+                                  pbn_hand: bytes):
+        assigned_cards = deal_converter.assign(transformed_cards)
+
+        formatted_deal, cards = deal_converter.format_pbn_and_cards(assigned_cards)
+
+        assert formatted_deal == pbn_hand
+        assert len(cards) == 52
+        assert converter.CardTuple('east', 's', '7') in cards
+        assert converter.CardTuple('south', 'd', '10') in cards
+
+    def test_format_pbn_and_cards_not_full_deal(self, deal_converter: converter.DealConverter,
+                                                assigned_cards):
+        short_deal = assigned_cards[:-1]
+        with pytest.raises(ValueError, match="got 51 cards"):
+            deal_converter.format_pbn_and_cards(short_deal)
+
+        duplicated_deal = assigned_cards[:-1] + [dict(assigned_cards[0], hand=assigned_cards[-1]['hand'])]
+        with pytest.raises(ValueError, match="51 distinct"):
+            deal_converter.format_pbn_and_cards(duplicated_deal)
+
+        uneven_deal = assigned_cards[:-1] + [dict(assigned_cards[-1], hand='north')]
+        with pytest.raises(ValueError, match="13 cards for each player"):
+            deal_converter.format_pbn_and_cards(uneven_deal)
+
     def test_write_pbn(self, deal_converter: converter.DealConverter, transformed_cards, pbn_hand: bytes):
         assigned_cards = deal_converter.assign(transformed_cards)
         deal_converter.card_ = pd.DataFrame(assigned_cards)  # not best practice
@@ -210,19 +284,19 @@ class TestAssigner:
         assert card.query("quadrant == 'margin'").hand.isna().all()
 
     @pytest.mark.verbose
-    def test_find_closest_obj(self, assigner: converter.Assigner):
+    def test_assign_remaining_objs(self, assigner: converter.Assigner):
         assigner._divide_to_quadrants()
         assigner._mark_core_objs()
         assigner._drop_core_duplicates()
         assigner._assign_core_objs()
 
-        remaining = assigner._list_remaining_objs()
-        obj_idx, hand, distance = assigner._find_closest_obj(remaining)
+        n_assigned = assigner._assign_remaining_objs()
 
-        card_name = assigner.objs.at[obj_idx, 'name']
-        assert card_name == '10h'
-        assert hand == 'south'
-        assert 0.02 < distance < 0.03
+        card = assigner.objs
+        assert n_assigned > 0
+        assert card.query("name == '10h'").hand.to_list() == ["south"]
+        assert card.hand.value_counts().max() <= 13
+        assert not card.dropna(subset=["hand"]).name.duplicated().any()
 
 class TestDdsAdapter:
 
@@ -242,6 +316,12 @@ class TestDdsAdapter:
         assert "NT" in formatted
         assert "South" in formatted
 
+    def test_solve_hands(self, pbn_hand, result):
+        results = adapter.solve_hands([pbn_hand] * 3)
+
+        assert len(results) == 3
+        assert all(adapter.result_to_records(r) == adapter.result_to_records(result) for r in results)
+
     def test_result_to_df(self, result):
         result_df = adapter.result_to_df(result)
 
@@ -273,3 +353,78 @@ class TestDdsAdapter:
 
         assert "NS score: NS -100\n" in formatted
         assert "NS list : NS:NS 3Sx" in formatted
+
+
+class TestBridgeSolver:
+    def test_solve_not_full_deal(self, solve, assigned_cards):
+        bridge_solver = solve.BridgeSolver(None, solve.MonoStringPresenter())
+
+        with pytest.raises(ValueError):
+            bridge_solver.solve(assigned_cards[:-1])
+        with pytest.raises(ValueError):
+            bridge_solver.solve_many([assigned_cards, assigned_cards[1:] + assigned_cards[:1] * 2])
+
+    def test_solve_many_par_no_resolve(self, solve, assigned_cards, monkeypatch):
+        bridge_solver = solve.BridgeSolver(None, solve.PrintPresenter())
+        solutions = bridge_solver.solve_many([assigned_cards, assigned_cards])
+
+        def unexpected_solve(*args):
+            raise AssertionError("DDS solved again")
+        monkeypatch.setattr(adapter, 'solve_hand', unexpected_solve)
+        monkeypatch.setattr(adapter, 'solve_hands', unexpected_solve)
+
+        assert len(solutions) == 2
+        assert "NS score: NS -100\n" in solutions[0].formatted_par
+        assert "NS list : NS:NS 3Sx" in solutions[1].formatted_par
+
+    def test_solve_async(self, solve, assigned_cards):
+        bridge_solver = solve.BridgeSolver(None, solve.PrintPresenter())
+
+        solution = bridge_solver.solve_async(assigned_cards).result()
+
+        assert isinstance(solution, solve.Solution)
+        assert solution is bridge_solver.solution_
+        assert solution.hand == bridge_solver.solve_many([assigned_cards])[0].hand
+
+
+class TestMonoStringPresenter:
+    def test_format_hand(self, solve, assigned_cards):
+        _, cards = converter.get_deal_converter().format_pbn_and_cards(assigned_cards)
+
+        formatted = solve.MonoStringPresenter()._format_hand(cards)
+
+        assert formatted == (
+            "       ♠KQ65        \n"
+            "       ♡KJ          \n"
+            "       ♢A52         \n"
+            "       ♣9632        \n"
+            " ♠9432 ┌────┐ ♠7    \n"
+            " ♡AT72 │    │ ♡Q86  \n"
+            " ♢K98  │    │ ♢QJ763\n"
+            " ♣JT   └────┘ ♣AK84 \n"
+            "       ♠AJT8        \n"
+            "       ♡9543        \n"
+            "       ♢T4          \n"
+            "       ♣Q75         \n"
+        )
+
+    def test_format_hand_voids(self, solve):
+        one_suit_each = b'W:...AKQJT98765432 AKQJT98765432... .AKQJT98765432.. ..AKQJT98765432.'
+        _, cards = converter.get_deal_converter().format_pbn_and_cards(pbn_to_cards(one_suit_each))
+
+        formatted = solve.MonoStringPresenter()._format_hand(cards)
+
+        assert formatted == (
+            "               ♠AKQJT98765432       \n"
+            "               ♡-                   \n"
+            "               ♢-                   \n"
+            "               ♣-                   \n"
+            "♠-             ┌────┐ ♠-            \n"
+            "♡-             │    │ ♡AKQJT98765432\n"
+            "♢-             │    │ ♢-            \n"
+            "♣AKQJT98765432 └────┘ ♣-            \n"
+            "               ♠-                   \n"
+            "               ♡-                   \n"
+            "               ♢AKQJT98765432       \n"
+            "               ♣-                   \n"
+        )
@@ -1,8 +1,6 @@
 import logging
 import sys
 
-import numpy as np
-
 
 def setup_basic_logging(**kwargs):
     logging.basicConfig(stream=sys.stdout,
@@ -11,10 +9,3 @@ def setup_basic_logging(**kwargs):
                         level=logging.INFO,
                         **kwargs)
 
-
-def point_line_dist(px, pa, pb):
-    """Distance between point x and line defined by two points: pa, pb"""
-    px = np.asarray(px)
-    pa = np.asarray(pa)
-    pb = np.asarray(pb)
-    return abs(np.cross(pb-pa, px-pa) / np.linalg.norm(pb-pa))